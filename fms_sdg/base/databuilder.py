@@ -187,6 +187,10 @@ class DataBuilder(ABC):
                 task.save_data(generated_inst)
                 filtered_data.append(generated_inst)
 
+            # write out everything saved during this request
+            for task in tasks:
+                task.flush()
+
             for task in tasks:
                 new_data = [
                     gen_inst
@@ -1,24 +1,144 @@
 # Standard
-from dataclasses import asdict, dataclass
-from typing import Any, List, Optional, TypeVar, Union
+from copy import deepcopy
+from dataclasses import asdict, dataclass, fields
+from operator import attrgetter
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
 import abc
-import json
+import atexit
 import os
+import types
+import weakref
 
 # Local
-from fms_sdg.utils import group_data_by_attribute
+from fms_sdg.utils import (
+    group_data_by_attribute,
+    json_dumps_line,
+    json_loads,
+    sdg_logger,
+)
 
 DEFAULT_OUTPUT_DIR = "output"
+DEFAULT_FLUSH_EVERY = 256
+_IO_BUFFER_SIZE = 1 << 16
+try:
+    # maximum number of buffers accepted by a single writev call
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = -1
+_IOV_MAX = _IOV_MAX if _IOV_MAX > 0 else 1024
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+_UNION_TYPES = (Union, getattr(types, "UnionType", Union))
+# tasks with data that may still be buffered, flushed once at interpreter exit. A weak set so
+# that registering for the exit flush doesn't keep a task alive
+_LIVE_TASKS: "weakref.WeakSet[SdgTask]" = weakref.WeakSet()
+
+
+def _is_scalar_type(field_type: Any) -> bool:
+    """Returns True if the type annotation only admits scalars (e.g., str or Optional[int])"""
+    if field_type in _SCALAR_TYPES:
+        return True
+    if get_origin(field_type) in _UNION_TYPES:
+        return all(_is_scalar_type(a) for a in get_args(field_type))
+    return False
+
+
+def _is_leaf_type(field_type: Any) -> bool:
+    """Returns True if the type annotation only admits scalars or parametrized containers of
+    them (e.g., List[str]). Any, unparametrized containers (list, dict, tuple) and anything
+    else (including string forward references) may hold a dataclass"""
+    if field_type in _SCALAR_TYPES:
+        return True
+    if get_origin(field_type) in (list, dict, tuple) + _UNION_TYPES:
+        args = [a for a in get_args(field_type) if a is not Ellipsis]
+        return bool(args) and all(_is_leaf_type(a) for a in args)
+    return False
+
+
+def _is_class_var(annotation: Any) -> bool:
+    if isinstance(annotation, str):
+        return annotation.startswith(("ClassVar", "typing.ClassVar"))
+    return annotation is ClassVar or get_origin(annotation) is ClassVar
 
 
 @dataclass
 class SdgData(abc.ABC):
-    """This class is intended to hold the seed / machine generated instruction data"""
+    """This class is intended to hold the seed / machine generated instruction data
+
+    Instances are stored without a per-instance __dict__. Subclasses may declare __slots__
+    listing their own fields to keep it that way (dataclass(slots=True) is not available
+    before Python 3.10). Two limits apply:
+        - a field with a default value cannot be listed in __slots__ (Python raises
+          "ValueError: ... in __slots__ conflicts with class variable"), so a subclass with
+          defaulted fields should not declare __slots__ at all
+        - a declared __slots__ must list every field of the subclass, which is checked when
+          the subclass is defined
+    Subclasses that do not declare __slots__ work as before, their instances just carry a
+    __dict__
+    """
+
+    __slots__ = ("task_name",)
 
     task_name: str
 
+    def __init_subclass__(cls, **kwargs: Any):
+        super().__init_subclass__(**kwargs)
+        if "__slots__" in cls.__dict__:
+            slots = cls.__dict__["__slots__"]
+            slots = (slots,) if isinstance(slots, str) else tuple(slots)
+            missing = [
+                name
+                for name, annotation in cls.__dict__.get("__annotations__", {}).items()
+                if name not in slots and not _is_class_var(annotation)
+            ]
+            if missing:
+                raise TypeError(
+                    f"__slots__ of {cls.__name__} is missing fields {missing}, either list "
+                    "every field in __slots__ or do not declare __slots__"
+                )
+
     def to_output_dict(self):
-        return asdict(self)
+        to_dict = type(self).__dict__.get("_fast_to_dict")
+        if to_dict is None:
+            to_dict = type(self)._build_fast_dict()
+        return to_dict(self)
+
+    @classmethod
+    def _build_fast_dict(cls) -> Callable[["SdgData"], dict]:
+        """Builds the function used by to_output_dict and caches it on the class. When no field
+        can hold a nested dataclass, the recursive conversion done by asdict is skipped: scalar
+        fields are read as is and only container fields are copied
+        """
+        cls_fields = fields(cls)
+        if all(_is_leaf_type(f.type) for f in cls_fields):
+            names = tuple(f.name for f in cls_fields)
+            if len(names) == 1:
+                single_getter = attrgetter(names[0])
+                getter = lambda obj: (single_getter(obj),)
+            else:
+                getter = attrgetter(*names)
+            to_copy = tuple(not _is_scalar_type(f.type) for f in cls_fields)
+            if any(to_copy):
+                to_dict = lambda obj: {
+                    name: deepcopy(val) if copy_val else val
+                    for name, copy_val, val in zip(names, to_copy, getter(obj))
+                }
+            else:
+                to_dict = lambda obj: dict(zip(names, getter(obj)))
+        else:
+            to_dict = asdict
+        cls._fast_to_dict = to_dict
+        return to_dict
 
 
 class PostProcessingType(type):
@@ -45,6 +165,7 @@ class SdgTask(metaclass=PostProcessingType):
         output_dir: Optional[str] = None,
         seed_data: Optional[List[Any]] = None,
         num_outputs_to_generate: Optional[int] = None,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
         **kwargs: Any,
     ):
         self._name = name
@@ -53,14 +174,31 @@ class SdgTask(metaclass=PostProcessingType):
         self._data_builder = data_builder
         self._num_outputs_to_generate = num_outputs_to_generate
         self.machine_data = []
+        # number of records saved to / loaded from the default output path
+        self._count = 0
 
         self._output_dir = output_dir if output_dir is not None else DEFAULT_OUTPUT_DIR
         self._output_path = self._get_default_output_path()
+        os.makedirs(os.path.dirname(self._output_path), exist_ok=True)
+
+        # data passed to save_data is buffered and written out in batches of flush_every
+        self._flush_every = flush_every
+        self._pending: List[SdgData] = []
+        _LIVE_TASKS.add(self)
+
         self._seed_data = seed_data
 
     def __post_init__(self):
         # we use post_init for cases when examples are instantiated with elements from subclass __init__
-        self._seed_data = [self.instantiate_input_example(**s) for s in self._seed_data]
+        if type(self).instantiate_input_example is SdgTask.instantiate_input_example:
+            # default instantiation, so build examples directly and skip the per-example method call
+            ctor, name = self.INPUT_DATA_TYPE, self._name
+            self._seed_data = [
+                ctor(**{"task_name": name, **s}) for s in self._seed_data
+            ]
+        else:
+            ctor = self.instantiate_input_example
+            self._seed_data = [ctor(**s) for s in self._seed_data]
 
     def instantiate_input_example(self, **kwargs: Any):
         return self.INPUT_DATA_TYPE(
@@ -95,7 +233,9 @@ class SdgTask(metaclass=PostProcessingType):
         return self._num_outputs_to_generate
 
     def is_complete(self):
-        return len(self.machine_data) > self.num_outputs_to_generate
+        if self._num_outputs_to_generate is None:
+            return False
+        return self._count >= self._num_outputs_to_generate
 
     def _get_default_output_path(self):
         path_components = []
@@ -105,36 +245,111 @@ class SdgTask(metaclass=PostProcessingType):
         return os.path.join(*path_components)
 
     def save_data(
-        self, new_data: Union[SdgData, List[SdgData]], output_path: str = None
+        self, new_data: Union[SdgData, Iterable[SdgData]], output_path: str = None
     ) -> None:
-        if type(new_data) != list:
-            new_data = [new_data]
-
-        output_path = self._output_path if output_path is None else output_path
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "a") as f:
-            for d in new_data:
-                f.write(json.dumps(d.to_output_dict()) + "\n")
+        if output_path is not None and output_path != self._output_path:
+            if isinstance(new_data, SdgData):
+                new_data = (new_data,)
+            self._write_data(new_data, output_path)
+            return
+
+        # single records (the common case when saving incrementally) are added directly
+        if isinstance(new_data, SdgData):
+            self._pending.append(new_data)
+            self._count += 1
+        else:
+            prev_len = len(self._pending)
+            self._pending.extend(new_data)
+            self._count += len(self._pending) - prev_len
+        if len(self._pending) >= self._flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes any data buffered by save_data to the output file"""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._write_data(pending, self._output_path)
+
+    def __del__(self) -> None:
+        # the exit hook only holds a weak reference, so a task collected before exit
+        # writes out its own buffer
+        if getattr(self, "_pending", None):
+            self.flush()
+
+    def _write_data(self, data: Iterable[SdgData], output_path: str) -> None:
+        if output_path != self._output_path:
+            # the default output directory is already created in __init__
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # serialize the whole batch up front so it goes out in as few writes as possible
+        lines = [json_dumps_line(d.to_output_dict()) for d in data]
+        if hasattr(os, "writev"):
+            fd = os.open(output_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                _writev_all(fd, lines)
+            finally:
+                os.close(fd)
+        else:
+            with open(output_path, "ab") as f:
+                f.write(b"".join(lines))
 
     def load_data(self, output_path: str = None) -> List[SdgData]:
         output_path = self._output_path if output_path is None else output_path
-        with open(output_path, "r") as f:
-            try:
-                machine_data = [
-                    self.instantiate_output_example(**json.loads(l.strip()))
-                    for l in f.readlines()
-                ]
-            except ValueError:
-                machine_data = []
+        if output_path == self._output_path:
+            self.flush()
+        if type(self).instantiate_output_example is SdgTask.instantiate_output_example:
+            # default instantiation, so skip the per-record method call
+            ctor = self.OUTPUT_DATA_TYPE
+        else:
+            ctor = self.instantiate_output_example
+        loads = json_loads
+        machine_data = []
+        with open(output_path, "rb", buffering=_IO_BUFFER_SIZE) as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    machine_data.append(ctor(**loads(line)))
+                except ValueError:
+                    # skip corrupt records (e.g., a partially written final line)
+                    # rather than discarding everything that was loaded
+                    sdg_logger.warning(
+                        "Skipping malformed record on line %s of %s",
+                        line_no,
+                        output_path,
+                    )
 
         self.machine_data = machine_data
+        if output_path == self._output_path:
+            self._count = len(machine_data)
 
     def clear_data(self, output_path: str = None) -> List[SdgData]:
         output_path = self._output_path if output_path is None else output_path
+        if output_path == self._output_path:
+            self._pending = []
+            self._count = 0
         if os.path.exists(output_path):
             os.remove(output_path)
 
 
+def _writev_all(fd: int, buffers: List[bytes]) -> None:
+    """Writes buffers to fd with one vectored write per _IOV_MAX buffers, so a batch of
+    records needs neither a joined copy nor a syscall per record"""
+    for i in range(0, len(buffers), _IOV_MAX):
+        batch = buffers[i : i + _IOV_MAX]
+        written = os.writev(fd, batch)
+        if written < sum(len(b) for b in batch):
+            # short write, send whatever is left of this batch
+            remainder = memoryview(b"".join(batch))[written:]
+            while remainder:
+                remainder = remainder[os.write(fd, remainder) :]
+
+
+@atexit.register
+def _flush_live_tasks() -> None:
+    for task in list(_LIVE_TASKS):
+        task.flush()
+
+
 T = TypeVar("T")
 
 
@@ -12,6 +12,20 @@ import fms_sdg.utils as utils
 class ApiSdgData(SdgData):
     """This class is intended to hold the seed / machine generated instruction data"""
 
+    __slots__ = (
+        "instruction",
+        "input",
+        "output",
+        "positive_functions",
+        "seed_api_group",
+        "api_specifications",
+        "func_count_bounds",
+        "check_arg_question_overlap",
+        "intent_only",
+        "single_function",
+        "require_nested",
+    )
+
     instruction: str
     input: str
     output: str
@@ -11,6 +11,20 @@ from fms_sdg.databuilders.simple.task import InstructLabSdgData
 class SqlSdgData(SdgData):
     """This class is intended to hold the seed / machine generated instruction data"""
 
+    __slots__ = (
+        "taxonomy_path",
+        "task_description",
+        "instruction",
+        "input",
+        "output",
+        "document",
+        "ddl_schema",
+        "database_information",
+        "ground_truth",
+        "query_logs",
+        "context",
+    )
+
     taxonomy_path: str
     task_description: str
     instruction: str
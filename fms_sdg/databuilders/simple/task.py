@@ -10,6 +10,15 @@ from fms_sdg.base.task import SdgData, SdgTask
 class InstructLabSdgData(SdgData):
     """This class is intended to hold the seed / machine generated instruction data"""
 
+    __slots__ = (
+        "taxonomy_path",
+        "task_description",
+        "instruction",
+        "input",
+        "output",
+        "document",
+    )
+
     taxonomy_path: str
     task_description: str
     instruction: str
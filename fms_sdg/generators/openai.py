@@ -12,9 +12,9 @@ THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLI
 
 # Standard
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from importlib.util import find_spec
-from typing import Any, Dict, List
-import copy
+from typing import Any, Dict, List, Optional
 
 # Third Party
 from tqdm import tqdm
@@ -24,6 +24,7 @@ from fms_sdg.base.instance import Instance
 from fms_sdg.base.registry import get_resource, register_generator
 from fms_sdg.generators.llm import LMGenerator
 from fms_sdg.resources.openai import OpenAIKeyResource
+from fms_sdg.utils import sdg_logger
 import fms_sdg.generators.utils as generator_utils
 import fms_sdg.utils as utils
 
@@ -33,16 +34,24 @@ try:
 except ModuleNotFoundError:
     pass
 
+DEFAULT_MAX_CONCURRENCY = 8
+# the OpenAI chat completions API accepts at most 4 stop sequences
+DEFAULT_MAX_STOP_SEQUENCES = 4
 
-def oa_completion(client, chat: bool = False, **kwargs):
+
+def oa_completion(
+    client, chat: bool = False, stream_until: Optional[List[str]] = None, **kwargs
+):
     """Query OpenAI API for completion.
 
-    Retry with back-off until they respond
+    Retry with back-off until they respond or the retries run out. If `stream_until` is
+    given, the chat response is streamed and its text is returned once one of those
+    sequences shows up
     """
-    if not find_spec("openai") or not find_spec("tiktoken"):
+    if not find_spec("openai"):
         raise Exception(
-            "attempted to use 'openai' LM type, but package `openai` or `tiktoken` are not installed. "
-            "Please install these via `pip install fms_sdg[openai]`"
+            "attempted to use 'openai' LM type, but package `openai` is not installed. "
+            "Please install it via `pip install fms_sdg[openai]`"
         )
     else:
         # Third Party
@@ -56,11 +65,27 @@ def oa_completion(client, chat: bool = False, **kwargs):
 
     @generator_utils.retry_on_specific_exceptions(
         on_exceptions=[openai.OpenAIError],
-        max_retries=None,  # retry forever, consider changing
+        max_retries=8,
+        backoff_time=1.0,
+        backoff_multiplier=2.0,
+        max_backoff_time=60.0,
+        jitter=True,
+        # client errors that will fail the same way on every retry
+        no_retry_exceptions=[
+            openai.BadRequestError,
+            openai.AuthenticationError,
+            openai.PermissionDeniedError,
+            openai.NotFoundError,
+        ],
         on_exception_callback=_exception_callback,
     )
     def completion():
-        if chat:
+        if chat and stream_until:
+            # the stream is read in here so that an error mid-stream is retried too
+            return _read_until(
+                client.chat.completions.create(stream=True, **kwargs), stream_until
+            )
+        elif chat:
             return client.chat.completions.create(**kwargs)
         else:
             return client.completions.create(**kwargs)
@@ -68,8 +93,30 @@ def oa_completion(client, chat: bool = False, **kwargs):
     return completion()
 
 
+def _read_until(stream, until: List[str]) -> str:
+    text = ""
+    # a stop sequence may straddle two deltas, so look back just far enough to catch it
+    lookback = max(len(term) for term in until) - 1
+    try:
+        for event in stream:
+            if not event.choices or not event.choices[0].delta.content:
+                continue
+            start = max(len(text) - lookback, 0)
+            text += event.choices[0].delta.content
+            tail = text[start:]
+            if any(term in tail for term in until):
+                break
+    finally:
+        stream.close()
+    return text
+
+
 @register_generator("openai-chat", "local-chat-completions")
 class OpenaiChatCompletionsLM(LMGenerator):
+    # tiktoken encoders are expensive to build (they load the BPE merges), so they are
+    # shared across instances and only built when tokenization is actually requested
+    _enc_cache: Dict[str, "tiktoken.Encoding"] = dict()
+
     def __init__(self, name: str, config: Dict, **kwargs: Any) -> None:
         """
 
@@ -81,6 +128,11 @@ class OpenaiChatCompletionsLM(LMGenerator):
             using the **gen_kwargs passed on init
         :param truncate: bool
             Truncate input if too long (if False and input is too long, throw error)
+        :param max_concurrency: int
+            Maximum number of completion requests in flight at once
+        :param max_stop_sequences: int
+            Maximum number of stop sequences forwarded to the API (0 for models that reject
+            `stop`). All stop sequences are always applied to the returned text
         """
         super().__init__(name, config, **kwargs)
         try:
@@ -88,8 +140,8 @@ class OpenaiChatCompletionsLM(LMGenerator):
             import openai  # noqa: E401
         except ModuleNotFoundError:
             raise Exception(
-                "attempted to use 'openai' LM type, but package `openai` or `tiktoken` are not installed. \
-    please install these via `pip install lm-eval[openai]` or `pip install -e .[openai]`",
+                "attempted to use 'openai' LM type, but package `openai` is not installed. "
+                "Please install it via `pip install fms_sdg[openai]`"
             )
 
         self.model_id_or_path: str = config.get(
@@ -108,6 +160,50 @@ class OpenaiChatCompletionsLM(LMGenerator):
             )
             self.client = OpenAI(api_key=self._openai_resource.key)
 
+        self.max_concurrency: int = config.get(
+            "max_concurrency",
+            (
+                self._openai_resource.max_threads
+                if not self.base_url
+                else DEFAULT_MAX_CONCURRENCY
+            ),
+        )
+        self.max_stop_sequences: int = config.get(
+            "max_stop_sequences", DEFAULT_MAX_STOP_SEQUENCES
+        )
+
+    @classmethod
+    def _get_encoder(cls, model_id: str) -> "tiktoken.Encoding":
+        encoder = cls._enc_cache.get(model_id)
+        if encoder is None:
+            try:
+                # Third Party
+                import tiktoken
+            except ModuleNotFoundError:
+                raise Exception(
+                    "attempted to tokenize with 'openai' LM type, but package `tiktoken` is not installed. "
+                    "Please install it via `pip install fms_sdg[openai]`"
+                )
+
+            try:
+                encoder = tiktoken.encoding_for_model(model_id)
+            except KeyError:
+                # not an OpenAI model (e.g., a locally hosted one), use the default encoding
+                sdg_logger.warning(
+                    f"No tiktoken encoding found for model {model_id}, token counts are "
+                    "approximated with cl100k_base"
+                )
+                encoder = tiktoken.get_encoding("cl100k_base")
+            cls._enc_cache[model_id] = encoder
+        return encoder
+
+    @property
+    def eot_token_id(self):
+        return self._get_encoder(self.model_id_or_path).eot_token
+
+    def tok_encode(self, string: str, **kwargs) -> List[int]:
+        return self._get_encoder(self.model_id_or_path).encode(string)
+
     @property
     def max_length(self) -> int:
         # Note: the OpenAI API supports up to 2049 tokens, with the first token being the first input token
@@ -130,59 +226,140 @@ class OpenaiChatCompletionsLM(LMGenerator):
     def generate_batch(
         self, requests: List[Instance], disable_tqdm: bool = False
     ) -> None:
-        # we group requests by their generation_kwargs,
-        grouper = generator_utils.Grouper(requests, lambda x: str(x.kwargs))
+        # we group requests by their generation_kwargs, keyed on the sorted kwargs items
+        # (lists made into tuples) to avoid building a string for every request
+        grouped: Dict[Any, List[Instance]] = dict()
+        for req in requests:
+            key = tuple(
+                sorted(
+                    (k, tuple(v) if isinstance(v, list) else v)
+                    for k, v in req.kwargs.items()
+                )
+            )
+            try:
+                grouped.setdefault(key, []).append(req)
+            except TypeError:
+                # kwargs hold nested unhashable values
+                grouped.setdefault(str(req.kwargs), []).append(req)
+
         pbar = tqdm(
             total=len(requests),
             disable=(disable_tqdm or (self.rank != 0)),
             desc="Running generate_batch requests",
         )
-        for key, reqs in grouper.get_grouped().items():
-            # n needs to be 1 because messages in
-            # chat completion are not batch but
-            # is regarded as a single conversation.
-            chunks: List[List[Instance]] = generator_utils.chunks(reqs, n=1)
-
-            for chunk in chunks:
-                inputs = [
-                    {"role": "user", "content": instance.args[0]} for instance in chunk
-                ]
-                # all kwargs are identical
-                gen_kwargs = next(iter(chunk)).kwargs
-
-                until = None
-                if isinstance(kwargs := copy.deepcopy(gen_kwargs), dict):
-                    # start with default params in self.config then overwrite with kwargs
-                    kwargs = {**self._base_kwargs, **kwargs}
-
-                    kwargs["max_tokens"] = kwargs.pop("max_gen_toks", self.max_gen_toks)
-                    if "max_new_tokens" in kwargs:
-                        kwargs["max_tokens"] = kwargs.pop("max_new_tokens")
-                    if "stop_sequences" in kwargs:
-                        kwargs["stop"] = kwargs.pop("stop_sequences")
-                    if "decoding_method" in kwargs:
-                        kwargs["do_sample"] = kwargs.pop("decoding_method") == "greedy"
-                    model_id = kwargs.pop("model_id", self.model_id_or_path)
-                    kwargs["stop"] = until
-                else:
-                    raise ValueError(
-                        f"Expected repr(kwargs) to be of type repr(dict) but got {kwargs}"
+        # requests are sent concurrently, each future maps back to the chunk it was issued for
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = dict()
+            for reqs in grouped.values():
+                # all kwargs are identical within a group
+                gen_kwargs = next(iter(reqs)).kwargs
+                kwargs = self.modify_gen_kwargs(gen_kwargs)
+                model_id = kwargs.pop("model_id", self.model_id_or_path)
+                # truncation on the returned text uses every stop sequence, the API is only
+                # sent as many as it accepts
+                until = kwargs.pop("stop", None)
+                if isinstance(until, str):
+                    until = [until]
+                if until and self.max_stop_sequences > 0:
+                    kwargs["stop"] = until[: self.max_stop_sequences]
+
+                # with greedy decoding identical prompts give identical results, so each
+                # distinct prompt is sent once and its result is copied to the duplicates
+                dupes: Dict[str, List[Instance]] = dict()
+                decoding_method = gen_kwargs.get(
+                    "decoding_method", self._base_kwargs.get("decoding_method")
+                )
+                if decoding_method == "greedy":
+                    for req in reqs:
+                        dupes.setdefault(req.args[0], []).append(req)
+                    reqs = [same_prompt[0] for same_prompt in dupes.values()]
+
+                # n needs to be 1 because messages in
+                # chat completion are not batch but
+                # is regarded as a single conversation.
+                chunks: List[List[Instance]] = generator_utils.chunks(reqs, n=1)
+
+                for chunk in chunks:
+                    future = executor.submit(
+                        self._generate_chunk, chunk, model_id, kwargs, until
                     )
+                    futures[future] = (chunk, until, dupes)
+
+            try:
+                for future in as_completed(futures):
+                    chunk, until, dupes = futures[future]
+                    for s, instance in zip(future.result(), chunk):
+                        for same_prompt in dupes.get(instance.args[0], [instance]):
+                            self.update_instance_with_result(s, same_prompt, until)
+                            pbar.update(1)
+            except BaseException:
+                # don't let the executor shutdown wait on (and retry) every queued request
+                # before the error reaches the caller
+                for future in futures:
+                    future.cancel()
+                raise
 
-                response = oa_completion(
-                    client=self.client,
-                    chat=True,
-                    messages=inputs,
-                    model=model_id,
-                    **kwargs,
-                )
+        pbar.close()
 
-                for resp, instance in zip(response.choices, chunk):
-                    s = resp.message.content
-                    self.update_instance_with_result(s, instance, until)
-                    pbar.update(1)
+    def modify_gen_kwargs(self, gen_kwargs: Dict) -> Dict:
+        if isinstance(gen_kwargs, dict):
+            # start with default params in self.config then overwrite with kwargs. Only
+            # top-level keys are modified below, so this new dict is all the copying needed
+            kwargs = {**self._base_kwargs, **gen_kwargs}
+
+            kwargs["max_tokens"] = kwargs.pop("max_gen_toks", self.max_gen_toks)
+            if "max_new_tokens" in kwargs:
+                kwargs["max_tokens"] = kwargs.pop("max_new_tokens")
+            if "stop_sequences" in kwargs:
+                kwargs["stop"] = kwargs.pop("stop_sequences")
+            if "decoding_method" in kwargs:
+                kwargs["do_sample"] = kwargs.pop("decoding_method") == "greedy"
+        else:
+            raise ValueError(
+                f"Expected repr(kwargs) to be of type repr(dict) but got {gen_kwargs}"
+            )
+        return kwargs
+
+    def _prepare_input(self, chunk: List[Instance]) -> List[Dict]:
+        return [{"role": "user", "content": instance.args[0]} for instance in chunk]
+
+    def _generate_chunk(
+        self,
+        chunk: List[Instance],
+        model_id: str,
+        kwargs: Dict,
+        until: Optional[List[str]] = None,
+    ) -> List[str]:
+        # inputs are built on the worker thread so that preparing the next chunk
+        # overlaps with the network wait of the chunks already in flight
+        messages = self._prepare_input(chunk)
+        # the server already stops on the stop sequences it was sent, the rest are only
+        # caught by streaming the response and reading until one of them shows up
+        stream_until = [
+            term for term in (until or [])[len(kwargs.get("stop") or []) :] if term
+        ]
+        if stream_until:
+            text = oa_completion(
+                client=self.client,
+                chat=True,
+                stream_until=stream_until,
+                messages=messages,
+                model=model_id,
+                **kwargs,
+            )
+            return [text]
+
+        response = oa_completion(
+            client=self.client,
+            chat=True,
+            messages=messages,
+            model=model_id,
+            **kwargs,
+        )
+        return [resp.message.content for resp in response.choices]
 
-        pbar.close()
+    def _loglikelihood_tokens(self, requests, **kwargs):
+        raise NotImplementedError("No support for logits.")
 
     def loglikelihood(self, requests, disable_tqdm: bool = False):
         raise NotImplementedError("No support for logits.")
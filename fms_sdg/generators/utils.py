@@ -29,6 +29,7 @@ import collections
 import fnmatch
 import gc
 import itertools
+import random
 import time
 
 # Third Party
@@ -140,6 +141,9 @@ def retry_on_specific_exceptions(
     backoff_time: float = 3.0,
     backoff_multiplier: float = 1.5,
     on_exception_callback: Optional[Callable[[Exception, float], Any]] = None,
+    max_backoff_time: Optional[float] = None,
+    jitter: bool = False,
+    no_retry_exceptions: Optional[List[Type[Exception]]] = None,
 ):
     """Retry on an LLM Provider's rate limit error with exponential backoff
     For example, to use for OpenAI, do the following:
@@ -152,6 +156,10 @@ def retry_on_specific_exceptions(
         # Wrap OpenAI completion function here
         ...
     ```
+    The sleep time is capped at `max_backoff_time` (if given) and, with `jitter`, scaled by a
+    random factor in [0.5, 1) so that concurrent callers do not retry in lockstep. Exceptions in
+    `no_retry_exceptions` are raised immediately, as is the last exception once `max_retries`
+    attempts have failed
     """
 
     def decorator(func: Callable):
@@ -159,15 +167,26 @@ def retry_on_specific_exceptions(
         def wrapper(*args, **kwargs):
             sleep_time = backoff_time
             attempt = 0
-            while max_retries is None or attempt < max_retries:
+            while True:
                 try:
                     return func(*args, **kwargs)
+                except tuple(no_retry_exceptions or []):
+                    raise
                 except tuple(on_exceptions) as e:
+                    attempt += 1
+                    if max_retries is not None and attempt >= max_retries:
+                        raise
+                    wait_time = (
+                        sleep_time * (0.5 + random.random() / 2)
+                        if jitter
+                        else sleep_time
+                    )
                     if on_exception_callback is not None:
-                        on_exception_callback(e, sleep_time)
-                    time.sleep(sleep_time)
+                        on_exception_callback(e, wait_time)
+                    time.sleep(wait_time)
                     sleep_time *= backoff_multiplier
-                    attempt += 1
+                    if max_backoff_time is not None:
+                        sleep_time = min(sleep_time, max_backoff_time)
 
         return wrapper
 
@@ -1,6 +1,7 @@
 # Standard
 from collections import ChainMap
-from typing import Any, Callable, List, TypeVar
+from operator import attrgetter
+from typing import Any, Callable, List, TypeVar, Union
 import collections
 import copy
 import fnmatch
@@ -19,6 +20,34 @@ logging.basicConfig(
 )
 sdg_logger = logging.getLogger("fms_sdg")
 
+# json (de)serialization used for reading / writing data files. orjson is
+# preferred when installed (`pip install fms_sdg[fastjson]`), then ujson, then
+# the standard library. json_dumps_line always returns a utf-8 encoded jsonl record,
+# including its terminating newline
+try:
+    # Third Party
+    import orjson
+
+    def json_dumps_line(obj: Any) -> bytes:
+        return orjson.dumps(
+            obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        )
+
+    json_loads: Callable[[Union[str, bytes]], Any] = orjson.loads
+
+except ModuleNotFoundError:
+    try:
+        # Third Party
+        import ujson as _json
+    except ModuleNotFoundError:
+        # Standard
+        import json as _json
+
+    def json_dumps_line(obj: Any) -> bytes:
+        return (_json.dumps(obj) + "\n").encode("utf-8")
+
+    json_loads: Callable[[Union[str, bytes]], Any] = _json.loads
+
 
 def all_annotations(cls) -> ChainMap:
     return ChainMap(
@@ -243,11 +272,8 @@ T = TypeVar("T")
 
 
 def group_data_by_attribute(data_list: List[T], attr: str) -> List[List[T]]:
-    attr_values = set([getattr(data_item, attr) for data_item in data_list])
-    return [
-        [data_item for data_item in data_list if getattr(data_item, attr) == attr_value]
-        for attr_value in attr_values
-    ]
+    # single pass over the data, groups are returned in order of first appearance
+    return group(data_list, attrgetter(attr))
 
 
 def merge_dictionaries(*args: List[dict]):
@@ -10,6 +10,14 @@ from fms_sdg.base.task import SdgData, SdgTask
 class TemplateSdgData(SdgData):
     """This class is intended to hold the seed / machine generated instruction data"""
 
+    # __slots__ must list every field below. If any field is given a default value, remove
+    # __slots__ entirely (a slotted field cannot have a default), see SdgData for details
+    __slots__ = (
+        "instruction",
+        "input",
+        "output",
+    )
+
     instruction: str
     input: str
     output: str
@@ -0,0 +1,135 @@
+# Standard
+from dataclasses import asdict, dataclass
+from typing import Any, List, Optional
+import os
+
+# Third Party
+import pytest
+
+# Local
+from fms_sdg.base.task import SdgData, SdgTask
+
+
+@dataclass
+class _TestSdgData(SdgData):
+    instruction: str
+    output: str
+
+
+@dataclass
+class _LeafSdgData(SdgData):
+    score: Optional[float]
+    tags: List[str]
+
+
+@dataclass
+class _NestedSdgData(SdgData):
+    extra: Any
+
+
+class _TestSdgTask(SdgTask):
+    INPUT_DATA_TYPE = _TestSdgData
+    OUTPUT_DATA_TYPE = _TestSdgData
+
+
+def _get_task(output_dir: str, **kwargs) -> SdgTask:
+    return _TestSdgTask(
+        name="test_task",
+        task_description="test task",
+        created_by="test",
+        data_builder="simple",
+        output_dir=output_dir,
+        seed_data=[{"instruction": "a", "output": "b"}],
+        num_outputs_to_generate=3,
+        **kwargs,
+    )
+
+
+class TestSdgData:
+    def test_to_output_dict_leaf_fields(self):
+        data = _LeafSdgData("test_task", 0.5, ["a", "b"])
+        output = data.to_output_dict()
+
+        assert _LeafSdgData._fast_to_dict is not asdict
+        assert output == asdict(data)
+        # containers are copied rather than shared with the record
+        assert output["tags"] is not data.tags
+
+    def test_to_output_dict_nested_fields(self):
+        inner = _LeafSdgData("test_task", None, [])
+        data = _NestedSdgData("test_task", inner)
+        output = data.to_output_dict()
+
+        assert _NestedSdgData._fast_to_dict is asdict
+        assert output == {"task_name": "test_task", "extra": asdict(inner)}
+
+    def test_slots_must_list_all_fields(self):
+        with pytest.raises(TypeError):
+
+            @dataclass
+            class _PartialSlotsSdgData(SdgData):
+                __slots__ = ("instruction",)
+
+                instruction: str
+                output: str
+
+        @dataclass
+        class _DefaultsSdgData(SdgData):
+            output: str = ""
+
+        assert _DefaultsSdgData("test_task").to_output_dict()["output"] == ""
+
+
+class TestSdgTask:
+    def test_save_load(self, tmp_path):
+        task = _get_task(str(tmp_path))
+        data = [_TestSdgData("test_task", f"instr {i}", f"out {i}") for i in range(3)]
+
+        task.save_data(data[0])
+        task.save_data(d for d in data[1:])
+        task.load_data()
+
+        assert task.machine_data == data
+
+    def test_load_skips_malformed_lines(self, tmp_path):
+        task = _get_task(str(tmp_path))
+        data = [_TestSdgData("test_task", f"instr {i}", f"out {i}") for i in range(2)]
+
+        task.save_data(data[0])
+        task.flush()
+        with open(task.output_path, "a") as f:
+            f.write('{"task_name": "test_task", "instr\n')
+        task.save_data(data[1])
+        task.load_data()
+
+        assert task.machine_data == data
+
+    def test_save_is_buffered(self, tmp_path):
+        task = _get_task(str(tmp_path), flush_every=2)
+        data = [_TestSdgData("test_task", f"instr {i}", f"out {i}") for i in range(3)]
+
+        task.save_data(data[0])
+        assert not os.path.exists(task.output_path)
+        task.save_data(data[1])
+        with open(task.output_path, "r") as f:
+            assert len(f.readlines()) == 2
+
+        task.save_data(data[2])
+        task.load_data()
+        assert task.machine_data == data
+
+    def test_is_complete(self, tmp_path):
+        task = _get_task(str(tmp_path))
+        data = [_TestSdgData("test_task", f"instr {i}", f"out {i}") for i in range(3)]
+
+        task.save_data(data[:2])
+        assert not task.is_complete()
+        task.save_data(data[2])
+        assert task.is_complete()
+
+        task.clear_data()
+        assert not task.is_complete()
+
+        task._num_outputs_to_generate = None
+        task.save_data(data)
+        assert not task.is_complete()
@@ -0,0 +1,103 @@
+# Third Party
+import pytest
+
+# Local
+from fms_sdg.generators.utils import retry_on_specific_exceptions
+import fms_sdg.generators.utils as generator_utils
+
+
+class _RetryableError(Exception):
+    pass
+
+
+class _FatalError(_RetryableError):
+    pass
+
+
+def _failing(exception: Exception, times: int = None):
+    """Returns a function that raises `exception` `times` times (always if None) before succeeding"""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if times is None or len(calls) <= times:
+            raise exception
+        return len(calls)
+
+    return func, calls
+
+
+class TestRetryOnSpecificExceptions:
+    @pytest.fixture(autouse=True)
+    def sleeps(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(generator_utils.time, "sleep", sleeps.append)
+        return sleeps
+
+    def test_retries_until_success(self, sleeps):
+        func, calls = _failing(_RetryableError(), times=2)
+        wrapped = retry_on_specific_exceptions(
+            [_RetryableError], max_retries=5, backoff_time=1.0, backoff_multiplier=2.0
+        )(func)
+        assert wrapped() == 3
+        assert len(calls) == 3
+        assert sleeps == [1.0, 2.0]
+
+    def test_raises_after_max_retries(self, sleeps):
+        func, calls = _failing(_RetryableError())
+        wrapped = retry_on_specific_exceptions([_RetryableError], max_retries=3)(func)
+        with pytest.raises(_RetryableError):
+            wrapped()
+        assert len(calls) == 3
+        assert len(sleeps) == 2
+
+    def test_other_exceptions_are_not_retried(self, sleeps):
+        func, calls = _failing(ValueError())
+        wrapped = retry_on_specific_exceptions([_RetryableError], max_retries=3)(func)
+        with pytest.raises(ValueError):
+            wrapped()
+        assert len(calls) == 1
+        assert not sleeps
+
+    def test_no_retry_exceptions(self, sleeps):
+        # _FatalError is a subclass of a retried exception, but no_retry_exceptions wins
+        func, calls = _failing(_FatalError())
+        wrapped = retry_on_specific_exceptions(
+            [_RetryableError], max_retries=3, no_retry_exceptions=[_FatalError]
+        )(func)
+        with pytest.raises(_FatalError):
+            wrapped()
+        assert len(calls) == 1
+        assert not sleeps
+
+    def test_backoff_is_capped(self, sleeps):
+        func, _ = _failing(_RetryableError())
+        wrapped = retry_on_specific_exceptions(
+            [_RetryableError],
+            max_retries=6,
+            backoff_time=1.0,
+            backoff_multiplier=3.0,
+            max_backoff_time=5.0,
+        )(func)
+        with pytest.raises(_RetryableError):
+            wrapped()
+        assert sleeps == [1.0, 3.0, 5.0, 5.0, 5.0]
+
+    @pytest.mark.parametrize("rand", [0.0, 0.5, 0.999])
+    def test_jitter(self, sleeps, monkeypatch, rand):
+        monkeypatch.setattr(generator_utils.random, "random", lambda: rand)
+        func, _ = _failing(_RetryableError())
+        wrapped = retry_on_specific_exceptions(
+            [_RetryableError],
+            max_retries=4,
+            backoff_time=2.0,
+            backoff_multiplier=2.0,
+            max_backoff_time=4.0,
+            jitter=True,
+        )(func)
+        with pytest.raises(_RetryableError):
+            wrapped()
+        # jitter scales the (capped) backoff by a factor in [0.5, 1)
+        factor = 0.5 + rand / 2
+        assert sleeps == pytest.approx([2.0 * factor, 4.0 * factor, 4.0 * factor])
+        assert all(sleep < 4.0 for sleep in sleeps)